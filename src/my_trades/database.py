@@ -2,14 +2,14 @@
 
 
 from dataclasses import dataclass
-from datetime import date, datetime
+from datetime import date
 from decimal import Decimal
-from itertools import tee
 from pathlib import Path
 import sqlite3
 from typing import Iterable, Callable
 from .record import (
-    Transaction, Stock, Option, Call, Put, csv_to_transactions)
+    KIND_STOCK, SYMBOL, Transaction, Stock, Call, Put,
+    csv_to_records, extract_csv_values, extract_symbol, new_transaction_id)
 
 
 DB_SCHEMA_SQL = """
@@ -71,24 +71,47 @@ VALUES
     ('joint');
 """
 
+# safe on any connection, none of these write to the database file
+CONNECTION_PRAGMA_SQL = """
+PRAGMA temp_store = MEMORY;
+PRAGMA cache_size = -16000;
+PRAGMA mmap_size = 268435456;
+"""
+# switching to WAL is persistent and needs write access, so it is only done
+# by the connection that ingests trades
+WRITE_PRAGMA_SQL = """
+PRAGMA journal_mode = WAL;
+PRAGMA synchronous = NORMAL;
+"""
+
 
-def init_connection(file: str = ':memory:'):
+def init_connection(file: str | Path = ':memory:', *, for_read: bool = True):
+    # the typed column conversion and Row wrapping are only needed when the
+    # trades are read back
+    detect_types = 0
+    if for_read:
+        detect_types = sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES
     need_schema = False
     if file == ':memory:':
         connection = sqlite3.connect(
-            file,
-            detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES)
+            file, isolation_level=None, detect_types=detect_types)
         need_schema = True
     else:
-        file_path = Path(file).expanduser().resolve()
+        file_path = Path(file).expanduser()
+        if not file_path.is_absolute():
+            file_path = file_path.resolve()
         if not file_path.exists():
             need_schema = True
         connection = sqlite3.connect(
-            file_path.as_uri(), uri=True,
-            detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES)
+            file_path.as_uri(), uri=True, isolation_level=None,
+            detect_types=detect_types)
+    connection.executescript(CONNECTION_PRAGMA_SQL)
+    if not for_read:
+        connection.executescript(WRITE_PRAGMA_SQL)
     if need_schema:
         create_schema(connection)
-    connection.row_factory = sqlite3.Row
+    if for_read:
+        connection.row_factory = sqlite3.Row
     return connection
 
 
@@ -97,7 +120,7 @@ def create_schema(connection: sqlite3.Connection):
     connection.commit()
 
 
-@dataclass
+@dataclass(slots=True)
 class Trade:
     account_number: str
     transaction_id: str
@@ -118,29 +141,54 @@ class Trade:
 STOCK_CLASS = 'stock'
 CALL_CLASS = 'call'
 PUT_CLASS = 'put'
+# equity class names indexed by holding kind
+EQUITY_CLASSES = (STOCK_CLASS, CALL_CLASS, PUT_CLASS)
 
 def stock_to_trade(stock: Transaction):
     return Trade(stock.account_number, stock.transaction_id, stock.cusip,
                  stock.holding.symbol, STOCK_CLASS, 0,
-                 int(stock.quantity * 100), None, stock.acquired_date,
-                 stock.sold_date, int(stock.cost * 100),
-                 int(stock.proceed * 100), stock.description,
+                 stock.quantity, None, stock.acquired_date,
+                 stock.sold_date, stock.cost,
+                 stock.proceed, stock.description,
                  int(stock.wash_sale))
 
 
 def option_to_trade(option: Transaction) -> Trade:
-    option_type = CALL_CLASS
-    if isinstance(option.holding, Put):
-        option_type = PUT_CLASS
     return Trade(option.account_number, option.transaction_id, option.cusip,
-                 option.holding.symbol, option_type,
-                 int(option.holding.strike * 100), int(option.quantity * 100),
+                 option.holding.symbol, EQUITY_CLASSES[option.holding.kind],
+                 int(option.holding.strike * 100), option.quantity,
                  option.holding.expiration, option.acquired_date,
-                 option.sold_date, int(option.cost *  100),
-                 int(option.proceed * 100), option.description,
+                 option.sold_date, option.cost,
+                 option.proceed, option.description,
                  int(option.wash_sale))
 
 
+def csv_entry_to_trade(csv_entry, account_number: str) -> Trade:
+    symbol, cusip, expiration, option_type, strike = extract_symbol(
+        csv_entry[SYMBOL])
+    description, quantity, acquired_date, sold_date, cost, proceed = \
+        extract_csv_values(csv_entry)
+
+    if option_type is None:
+        equity_class = STOCK_CLASS
+        strike = 0
+    else:
+        equity_class = PUT_CLASS if option_type == 'p' else CALL_CLASS
+        strike = int(strike * 100)
+    trade = Trade(account_number, '', cusip, symbol, equity_class, strike,
+                  quantity, expiration, acquired_date, sold_date, cost,
+                  proceed, description)
+    trade.transaction_id = f'{new_transaction_id(trade)}'
+    return trade
+
+
+def csv_to_trades(
+    csv_file: str | Path,
+    account_number: str = 'generic'
+) -> Iterable[Trade]:
+    return csv_to_records(csv_file, account_number, csv_entry_to_trade)
+
+
 def _to_decimal(value):
     return Decimal(value) / 100
 
@@ -155,9 +203,9 @@ def trade_to_transaction(trade: Trade) -> Transaction:
         holding = Put(trade.symbol, Decimal(trade.strike) / 100,
                       trade.expiration)
     return Transaction(trade.account_number, holding, trade.cusip,
-                       trade.description, _to_decimal(trade.quantity),
+                       trade.description, trade.quantity,
                        trade.acquired_date, trade.sold_date,
-                       _to_decimal(trade.cost), _to_decimal(trade.proceed),
+                       trade.cost, trade.proceed,
                        trade.transaction_id)
 
 
@@ -175,11 +223,11 @@ def trade_row_to_transaction(row: sqlite3.Row) -> Transaction:
     holding = _to_holding(row)
     return Transaction(
         row['account_number'], holding, row['cusip'], row['description'],
-        _to_decimal(row['quantity']),
+        row['quantity'],
         row['acquired_date'],
         row['sold_date'],
-        _to_decimal(row['cost']),
-        _to_decimal(row['proceed']), row['transaction_id' ],
+        row['cost'],
+        row['proceed'], row['transaction_id' ],
         bool(row['wash_sale']))
 
 
@@ -199,7 +247,7 @@ def transactions_to_trades(
 ) -> Iterable[Trade]:
 
     def trade_from_transaction(transaction: Transaction):
-        if isinstance(transaction.holding, Stock):
+        if transaction.holding.kind == KIND_STOCK:
             return stock_to_trade(transaction)
         return option_to_trade(transaction)
 
@@ -207,109 +255,112 @@ def transactions_to_trades(
         yield trade_from_transaction(transaction)
 
 
+# The VALUES placeholder is expanded to one row group per record so a whole
+# chunk of records is written by a single statement.
 INSERT_TRADE_SQL = """
 INSERT INTO trade (
     transaction_id, cusip, symbol, account_number, equity_class, strike,
     quantity, expiration, acquired_date, sold_date,
     cost, proceed, description, wash_sale)
 VALUES
-    (?,?,?,?,?,?,?,?,?,?,?,?,?,?)
+    {}
 ON CONFLICT(transaction_id) DO UPDATE
-    SET wash_sale=excluded.wash_sale;
+    SET wash_sale=excluded.wash_sale
+    WHERE excluded.wash_sale != 0;
 """
+TRADE_VALUES_SQL = '(?,?,?,?,?,?,?,?,?,?,?,?,?,?)'
+# positions in the trade rows bound to INSERT_TRADE_SQL
+TRADE_SYMBOL = 2
+TRADE_ACCOUNT_NUMBER = 3
 INSERT_ACCOUNT_SQL = """
-INSERT INTO account (account_number, account_type)
-VALUES (?,?);
+INSERT OR IGNORE INTO account (account_number, account_type)
+VALUES {};
 """
+ACCOUNT_VALUES_SQL = '(?,?)'
 INSERT_SYMBOL_SQL = """
-INSERT INTO symbol (symbol)
-VALUES (?);
+INSERT OR IGNORE INTO symbol (symbol)
+VALUES {};
 """
+SYMBOL_VALUES_SQL = '(?)'
 
-GET_TRANSACTION_ID_SQL = """
-SELECT transaction_id FROM trade;
-"""
-GET_ACCOUNT_SQL = """
-SELECT account_number FROM account;
-"""
-GET_SYMBOL_SQL = """
-SELECT symbol FROM symbol;
-"""
+# lowest host parameter limit across the sqlite versions we run on
+SQLITE_MAX_VARIABLE_NUMBER = 999
+
+
+def _chunked(iterable: Iterable, size: int) -> Iterable[list]:
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _insert_rows(connection: sqlite3.Connection, insert_sql: str,
+                 values_sql: str, rows: Iterable[tuple]) -> None:
+    chunk_size = SQLITE_MAX_VARIABLE_NUMBER // values_sql.count('?')
+    for chunk in _chunked(rows, chunk_size):
+        connection.execute(
+            insert_sql.format(','.join([values_sql] * len(chunk))),
+            [value for row in chunk for value in row])
 
 
 def insert_transactions(
     transactions: Iterable[Transaction],
     account_type: str
 ) -> Callable[[sqlite3.Connection], None]:
+    return insert_trades(transactions_to_trades(transactions), account_type)
 
-    trades = transactions_to_trades(transactions)
-    def prepare_trades(trades: Iterable[Trade]) -> Iterable[tuple]:
-        for trade in trades:
-            yield (trade.transaction_id,
-                   trade.cusip, trade.symbol, trade.account_number,
-                   trade.equity_class, trade.strike, trade.quantity,
-                   trade.expiration, trade.acquired_date,
-                   trade.sold_date, trade.cost, trade.proceed,
-                   trade.description, trade.wash_sale)
-
-    def prepare_account(accounts: Iterable[str]) -> Iterable[tuple]:
-        for account in accounts:
-            yield (account, account_type)
-
-    def prepare_symbol(symbols: Iterable[str]) -> Iterable[tuple]:
-        for symbol in symbols:
-            yield (symbol,)
-
-    def insert_account_to_db(trades: Iterable[Trade],
+
+def insert_trades(
+    trades: Iterable[Trade],
+    account_type: str
+) -> Callable[[sqlite3.Connection], None]:
+
+    def insert_account_to_db(rows: list[tuple],
                              connection: sqlite3.Connection) -> None:
-        account_numbers = {account_number[0] for account_number
-                           in connection.execute(GET_ACCOUNT_SQL)}
-        new_accounts = {t.account_number for t in trades
-                        if t.account_number not in account_numbers}
-        if new_accounts:
-            connection.executemany(
-                INSERT_ACCOUNT_SQL, prepare_account(new_accounts))
-            connection.commit()
-
-    def insert_symbol_to_db(trades: Iterable[Trade],
+        accounts = {row[TRADE_ACCOUNT_NUMBER] for row in rows}
+        _insert_rows(connection, INSERT_ACCOUNT_SQL, ACCOUNT_VALUES_SQL,
+                     [(account, account_type) for account in accounts])
+
+    def insert_symbol_to_db(rows: list[tuple],
                             connection: sqlite3.Connection) -> None:
-        existing_symbols = {symbol[0] for symbol in
-                   connection.execute(GET_SYMBOL_SQL)}
-        new_symbols = {t.symbol for t in trades
-                       if t.symbol not in existing_symbols}
-        if new_symbols:
-            connection.executemany(
-                INSERT_SYMBOL_SQL, prepare_symbol(new_symbols))
-            connection.commit()
+        symbols = {row[TRADE_SYMBOL] for row in rows}
+        _insert_rows(connection, INSERT_SYMBOL_SQL, SYMBOL_VALUES_SQL,
+                     [(symbol,) for symbol in symbols])
 
     def insert_to_db(connection: sqlite3.Connection) -> None:
-        existing_transaction_ids = {
-            transaction_id[0] for transaction_id
-            in connection.execute(GET_TRANSACTION_ID_SQL)}
-        trades_not_in_db = filter(
-            lambda x: (x.transaction_id not in existing_transaction_ids
-                or x.wash_sale != 0), trades)
-        trades_not_in_db, account_processing, symbol_processing = \
-            tee(trades_not_in_db, 3)
-        insert_account_to_db(account_processing, connection)
-        insert_symbol_to_db(symbol_processing, connection)
-        connection.executemany(
-            INSERT_TRADE_SQL, prepare_trades(trades_not_in_db))
-        connection.commit()
+        rows = [(t.transaction_id, t.cusip, t.symbol, t.account_number,
+                 t.equity_class, t.strike, t.quantity, t.expiration,
+                 t.acquired_date, t.sold_date, t.cost, t.proceed,
+                 t.description, t.wash_sale) for t in trades]
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            insert_account_to_db(rows, connection)
+            insert_symbol_to_db(rows, connection)
+            _insert_rows(connection, INSERT_TRADE_SQL, TRADE_VALUES_SQL, rows)
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
 
     return insert_to_db
 
 
 def _main_entrypoint(cli_args):
-    print(f"DB: {cli_args.db.resolve()}")
-    conn = init_connection(f'{cli_args.db.resolve()}')
+    db_path = cli_args.db.expanduser().resolve()
+    csv_path = cli_args.file.expanduser().resolve()
+    print(f"DB: {db_path}")
+    conn = init_connection(db_path, for_read=False)
     if cli_args.account_number == 'generic':
-        account_number = f'{cli_args.file.resolve().name}'.lower() \
+        account_number = csv_path.name.lower() \
             .split('.csv')[0].split('_')[-1].upper()
     else:
         account_number = cli_args.account_number
-    transactions = csv_to_transactions(f'{cli_args.file}', account_number)
-    insert_transactions(transactions, cli_args.account)(conn)
+    trades = csv_to_trades(csv_path, account_number)
+    insert_trades(trades, cli_args.account)(conn)
 
 
 DEFAULT_DB_FILE = 'trades.db'
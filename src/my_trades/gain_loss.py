@@ -1,93 +1,70 @@
 #!/bin/env python
 
-from collections import defaultdict
-from datetime import timedelta
-from decimal import Decimal
-from functools import reduce
-from itertools import tee
-from .transaction import csv_to_transactions
-from .record import Transaction, Option
-
-ONE_YEAR = timedelta(days=365)
-
-def calculate_long_term_gain_loss(
-    accumulator: Decimal,
-    transaction: Transaction
-) -> Decimal:
-    if isinstance(transaction.holding, Option):
-        return accumulator
-    if (transaction.sold_date - transaction.acquired_date) > ONE_YEAR:
-        return accumulator + (transaction.proceed - transaction.cost)
-    return accumulator
-
-
-def calculate_short_term_gain_loss(
-    accumulator: Decimal,
-    transaction: Transaction
-) -> Decimal:
-    if isinstance(transaction.holding, Option):
-        return accumulator + (transaction.proceed - transaction.cost)
-    if (transaction.sold_date - transaction.acquired_date) < ONE_YEAR:
-        return accumulator + (transaction.proceed - transaction.cost)
-    return accumulator
-
-
-def gain_loss(cumulative_gain_loss: tuple[Decimal, Decimal],
-              transaction: Transaction) -> tuple[Decimal, Decimal]:
-    return (
-        calculate_short_term_gain_loss(
-            cumulative_gain_loss[0], transaction),
-        calculate_long_term_gain_loss(
-            cumulative_gain_loss[1], transaction))
-
-
-def filtered_gain_loss(
-    symbols: tuple):
-    def _filtered_gain_loss(
-        cumulative_gain_loss: dict[str, tuple[Decimal, Decimal]],
-        transaction: Transaction
-    ) -> dict[str, tuple[Decimal, Decimal]]:
-        if transaction.holding.symbol in symbols:
-            short_term_gain_loss, long_term_gain_loss = (
-                calculate_short_term_gain_loss(
-                    cumulative_gain_loss[transaction.holding.symbol][0],
-                    transaction),
-                calculate_long_term_gain_loss(
-                    cumulative_gain_loss[transaction.holding.symbol][1],
-                    transaction))
-            cumulative_gain_loss[transaction.holding.symbol] = (
-                short_term_gain_loss, long_term_gain_loss)
-        return cumulative_gain_loss
-
-    return _filtered_gain_loss
+from typing import Iterable
+from .transaction import csv_to_transactions, parse_symbols
+from .record import KIND_STOCK, Transaction, cents_to_decimal
+
+ONE_YEAR_IN_DAYS = 365
+SHORT_TERM = 0
+LONG_TERM = 1
+
+
+def gain_loss_term(transaction: Transaction) -> int | None:
+    # options are always short term, a stock held exactly one year counts
+    # as neither
+    if transaction.holding.kind != KIND_STOCK:
+        return SHORT_TERM
+    days_held = transaction.days_held
+    if days_held < ONE_YEAR_IN_DAYS:
+        return SHORT_TERM
+    if days_held > ONE_YEAR_IN_DAYS:
+        return LONG_TERM
+    return None
+
+
+def summarize_gain_loss(
+    transactions: Iterable[Transaction],
+    symbols: set[str] | frozenset[str] = frozenset()
+) -> tuple[int, int, dict[str, list[int]]]:
+    totals = [0, 0]
+    symbols_gain_loss = {}
+    for transaction in transactions:
+        symbol = transaction.holding.symbol
+        if symbol in symbols:
+            symbol_gain_loss = symbols_gain_loss.get(symbol)
+            if symbol_gain_loss is None:
+                symbol_gain_loss = symbols_gain_loss[symbol] = [0, 0]
+        else:
+            symbol_gain_loss = None
+        term = gain_loss_term(transaction)
+        if term is None:
+            continue
+        amount = transaction.proceed - transaction.cost
+        totals[term] += amount
+        if symbol_gain_loss is not None:
+            symbol_gain_loss[term] += amount
+    return totals[SHORT_TERM], totals[LONG_TERM], symbols_gain_loss
 
 
 def _main_entrypoint(cli_args):
 
-    transactions, filtered_processing = \
-        tee(csv_to_transactions(cli_args.file, cli_args.account))
-
-    if cli_args.symbols:
-        symbols = {
-            symbol.strip().lower() for symbol in cli_args.symbols.split(",")}
-        filtered_result = reduce(
-            filtered_gain_loss(symbols),
-            filtered_processing,
-            defaultdict(lambda: (Decimal(0), Decimal(0))))
-        for key, value in filtered_result.items():
-            print(f'              Symbol: {key}')
-            print(f'short term gain/loss: {value[0]}')
-            print(f' long term gain/loss: {value[1]}')
-            print(f'     total gain/loss: {value[0] + value[1]}')
-            print('-' * 40)
+    symbols = parse_symbols(cli_args.symbols)
+    short_term_gain_loss, long_term_gain_loss, filtered_result = \
+        summarize_gain_loss(
+            csv_to_transactions(cli_args.file, cli_args.account), symbols)
+
+    for key, value in filtered_result.items():
+        print(f'              Symbol: {key}')
+        print(f'short term gain/loss: {cents_to_decimal(value[0])}')
+        print(f' long term gain/loss: {cents_to_decimal(value[1])}')
+        print(f'     total gain/loss: '
+              f'{cents_to_decimal(value[0] + value[1])}')
+        print('-' * 40)
     print('Summary:')
-    short_term_gain_loss, long_term_gain_loss = \
-        reduce(gain_loss, transactions,
-               (Decimal(0), Decimal(0)))
-    print(f'short term gain/loss: {short_term_gain_loss}')
-    print(f' long term gain/loss: {long_term_gain_loss}')
+    print(f'short term gain/loss: {cents_to_decimal(short_term_gain_loss)}')
+    print(f' long term gain/loss: {cents_to_decimal(long_term_gain_loss)}')
     print(f'     total gain/loss: '
-          f'{short_term_gain_loss + long_term_gain_loss}')
+          f'{cents_to_decimal(short_term_gain_loss + long_term_gain_loss)}')
 
 
 if __name__ == '__main__':
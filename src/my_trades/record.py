@@ -1,14 +1,17 @@
 #!/usr/bin/env python
 from collections import defaultdict
 from csv import reader
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import date, datetime
 from decimal import Decimal
+from functools import partial
 from itertools import count
 from operator import attrgetter
 from pathlib import Path
-from typing import Iterable
-from uuid import uuid3, NAMESPACE_URL
+import re
+import sys
+from typing import Any, Callable, ClassVar, Container, Iterable
+from uuid import UUID, uuid3, NAMESPACE_URL
 from .logger import logger
 
 
@@ -23,66 +26,112 @@ COST = 6
 # SHORT_TERM_GAIN_LOSS = 7
 # LONG_TERM_GAIN_LOSS = 8
 
+# holding kinds, usable as an index into per-kind tables
+KIND_STOCK = 0
+KIND_CALL = 1
+KIND_PUT = 2
 
-@dataclass
+
+@dataclass(slots=True, frozen=True)
 class Equity:
     symbol: str
+    kind: ClassVar[int]
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class Option(Equity):
     strike: Decimal
     expiration: date
 
 
+@dataclass(slots=True, frozen=True)
 class Call(Option):
-    pass
+    kind: ClassVar[int] = KIND_CALL
 
 
+@dataclass(slots=True, frozen=True)
 class Put(Option):
-    pass
+    kind: ClassVar[int] = KIND_PUT
 
 
+@dataclass(slots=True, frozen=True)
 class Stock(Equity):
-    pass
+    kind: ClassVar[int] = KIND_STOCK
 
 
-@dataclass
+@dataclass(slots=True)
 class Transaction:
     account_number: str
     holding: Stock | Call | Put
     cusip: str
     description: str
-    quantity: Decimal
+    # quantity, cost and proceed are kept in cents
+    quantity: int
     acquired_date: date
     sold_date: date
-    cost: Decimal
-    proceed: Decimal
-    transaction_id: str = ''
+    cost: int
+    proceed: int
+    _transaction_id: str | None = None
     wash_sale: bool = False
+    days_held: int = field(init=False)
+    # date.toordinal() of the two dates, for cheap int comparisons
+    acquired_ord: int = field(init=False)
+    sold_ord: int = field(init=False)
+
+    def __post_init__(self) -> None:
+        self.acquired_ord = self.acquired_date.toordinal()
+        self.sold_ord = self.sold_date.toordinal()
+        self.days_held = self.sold_ord - self.acquired_ord
+
+    @property
+    def transaction_id(self) -> str:
+        # generated on first use, ids are sequenced per key so transactions
+        # need to ask for it in file order
+        if self._transaction_id is None:
+            self._transaction_id = f'{new_transaction_id(self)}'
+        return self._transaction_id
+
+    @property
+    def quantity_decimal(self) -> Decimal:
+        return cents_to_decimal(self.quantity)
+
+    @property
+    def cost_decimal(self) -> Decimal:
+        return cents_to_decimal(self.cost)
+
+    @property
+    def proceed_decimal(self) -> Decimal:
+        return cents_to_decimal(self.proceed)
+
+    def __hash__(self) -> int:
+        return hash(self.cusip)
 
-    def __post_init__(self):
-        if self.transaction_id == '':
-            self.transaction_id = f'{new_transaction_id(self)}'
 
-    def __hash__(self):
-        return hash(self.cusip)
+def cents_to_decimal(cents: int) -> Decimal:
+    return Decimal(cents).scaleb(-2)
 
-    def __getitem__(self, key):
-        return self.__dict__.get(key)
 
+def _format_cents(cents: int) -> str:
+    # same text as '{:.2f}'.format() on the original Decimal amount, which
+    # keeps the generated transaction ids stable
+    units, hundredths = divmod(abs(cents), 100)
+    return f'-{units}.{hundredths:02d}' if cents < 0 \
+        else f'{units}.{hundredths:02d}'
 
-def _new_transaction_id():
+
+def _new_transaction_id() -> Callable[[Transaction], UUID]:
     registry = defaultdict(lambda: count(1))
 
     transaction_fields = attrgetter(
         'account_number', 'cusip', 'acquired_date', 'sold_date', 'quantity',
         'cost', 'proceed')
-    def generate_id(transaction: Transaction):
-        key = '{}-{}-{}-{}-{:.2f}-{:.2f}-{:.2f}'.format(
-            *transaction_fields(transaction))
-        sequence_id = f'{next(registry[key]):02d}'
-        return uuid3(NAMESPACE_URL, f'{key}-{sequence_id}')
+    def generate_id(transaction: Transaction) -> UUID:
+        (account_number, cusip, acquired_date, sold_date, quantity, cost,
+         proceed) = transaction_fields(transaction)
+        key = (f'{account_number}-{cusip}-{acquired_date}-{sold_date}-'
+               f'{_format_cents(quantity)}-{_format_cents(cost)}-'
+               f'{_format_cents(proceed)}')
+        return uuid3(NAMESPACE_URL, f'{key}-{next(registry[key]):02d}')
 
     return generate_id
 
@@ -90,74 +139,134 @@ def _new_transaction_id():
 new_transaction_id = _new_transaction_id()
 
 
-def convert_currency(value):
-    if value[0] == '$':
-        return Decimal(value[1:])
-    if value[0] == '(':
-        return -Decimal(value[2:-1])
-    if not value or value == '-':
-        return Decimal(0)
-    raise ValueError(f'invalid currency: {value}!')
-
-
-def extract_option_date(value):
-    return datetime.strptime(value, '%y%m%d').date()
-
-
-OPTION_TYPES = 'cpCP'
-
-
-def extract_symbol(value):
-    cusip_start_pos = value.index('(')
-    symbol_raw = value[:cusip_start_pos]
-    cusip = value[cusip_start_pos+1:-1]
-    digit_start = -1
-    for n, c in enumerate(symbol_raw):
-        if c.isdigit():
-            digit_start = n
-            break
-    if digit_start == -1:
-        return symbol_raw.lower(), cusip, None, None, None
-    if digit_start and symbol_raw[digit_start + 6] in OPTION_TYPES:
-        return (symbol_raw[:digit_start].lower(), cusip,
-                extract_option_date(symbol_raw[digit_start:digit_start+6]),
-                symbol_raw[digit_start + 6].lower(),
-                Decimal(symbol_raw[digit_start + 7:]))
-    for n in range(digit_start + 7, len(symbol_raw) + 1):
-        if symbol_raw[n] in OPTION_TYPES:
-            return (symbol_raw[:n-6].lower(), cusip,
-                    extract_option_date(symbol_raw[n-6:n]),
-                    symbol_raw[n].lower(),
-                    Decimal(symbol_raw[n+1:]))
-    raise ValueError(f'invalid symbol: {value}!')
+def to_cents(value: str | int | Decimal) -> int:
+    return round(Decimal(value) * 100)
+
+
+_CURRENCY_SYMBOLS = str.maketrans('', '', '$(),')
+# short amounts ($0.00, $1.50, ...) repeat a lot, longer ones rarely do
+_CURRENCY_CACHE: dict[str, int] = {'': 0, '-': 0}
+_CURRENCY_CACHE_MAX_LENGTH = 8
+
+
+def convert_currency(value: str) -> int:
+    value = value.strip()
+    cents = _CURRENCY_CACHE.get(value)
+    if cents is not None:
+        return cents
+    negative = value[0] == '('
+    if not negative and value[0] != '$':
+        raise ValueError(f'invalid currency: {value}!')
+    cents = to_cents(value.translate(_CURRENCY_SYMBOLS))
+    if negative:
+        cents = -cents
+    if len(value) < _CURRENCY_CACHE_MAX_LENGTH:
+        _CURRENCY_CACHE[value] = cents
+    return cents
+
+
+# statements repeat the same handful of dates over and over, so parsed
+# dates are memoized per format
+_DATE_CACHE: dict[str, date] = {}
+_OPTION_DATE_CACHE: dict[str, date] = {}
+
+
+def _mmddyyyy_to_date(value: str) -> date:
+    if len(value) != 10 or value[2] != '/' or value[5] != '/':
+        raise ValueError(f'invalid date: {value}!')
+    return date(int(value[6:10]), int(value[0:2]), int(value[3:5]))
+
+
+def _yymmdd_to_date(value: str) -> date:
+    if len(value) != 6:
+        raise ValueError(f'invalid date: {value}!')
+    year = int(value[0:2])
+    # same century pivot as strptime's %y
+    year += 2000 if year < 69 else 1900
+    return date(year, int(value[2:4]), int(value[4:6]))
+
+
+def _parse_date(value: str, to_date: Callable[[str], date], date_format: str,
+                cache: dict[str, date]) -> date:
+    parsed = cache.get(value)
+    if parsed is None:
+        try:
+            parsed = to_date(value)
+        except ValueError:
+            # anything not in the fixed layout, e.g. unpadded fields
+            parsed = datetime.strptime(value, date_format).date()
+        cache[value] = parsed
+    return parsed
+
+
+def parse_yymmdd(value: str) -> date:
+    return _parse_date(value, _yymmdd_to_date, '%y%m%d', _OPTION_DATE_CACHE)
+
+
+# ROOT[YYMMDD(C|P)STRIKE](CUSIP), the option part is only present for options
+SYMBOL_PATTERN = re.compile(
+    r'(?P<symbol>[^(]*?)'
+    r'(?:(?P<expiration>\d{6})(?P<option_type>[cpCP])(?P<strike>[\d.]+))?'
+    r'\((?P<cusip>.*)\)')
+
+
+def extract_symbol(
+    value: str
+) -> tuple[str, str, date | None, str | None, Decimal | None]:
+    matched = SYMBOL_PATTERN.fullmatch(value)
+    if matched is None:
+        raise ValueError(f'invalid symbol: {value}!')
+    symbol, expiration, option_type, strike, cusip = matched.groups()
+    # the same few symbols and cusips repeat on every row for them
+    symbol = sys.intern(symbol.lower())
+    cusip = sys.intern(cusip)
+    if option_type is None:
+        return symbol, cusip, None, None, None
+    return (symbol, cusip, parse_yymmdd(expiration),
+            option_type.lower(), Decimal(strike))
 
 
 DATE_FORMAT = '%m/%d/%Y'
+# descriptions are mostly the short security name, long ones are left alone
+_INTERN_MAX_LENGTH = 64
+
+
+def extract_csv_values(
+    csv_entry: list[str]
+) -> tuple[str, int, date, date, int, int]:
+    acquired_date = _parse_date(
+        csv_entry[ACQUIRED_DATE], _mmddyyyy_to_date, DATE_FORMAT, _DATE_CACHE)
+    sold_date = _parse_date(
+        csv_entry[SOLD_DATE], _mmddyyyy_to_date, DATE_FORMAT, _DATE_CACHE)
+    proceed = convert_currency(csv_entry[PROCEED])
+    cost = convert_currency(csv_entry[COST])
+    # short_term_gain_loss = convert_currency(csv_entry[SHORT_TERM_GAIN_LOSS])
+    # long_term_gain_loss = convert_currency(csv_entry[LONG_TERM_GAIN_LOSS])
+    quantity = to_cents(csv_entry[QUANTITY])
+    description = csv_entry[DESCRIPTION]
+    if len(description) < _INTERN_MAX_LENGTH:
+        description = sys.intern(description)
+    return (description, quantity, acquired_date, sold_date, cost, proceed)
 
 
 def build_transaction(account_number: str,
                       holding: Stock | Call | Put,
                       cusip: str,
-                      csv_entry) -> Transaction:
-    acquired_date = datetime.strptime(
-        csv_entry[ACQUIRED_DATE], DATE_FORMAT).date()
-    sold_date = datetime.strptime(
-        csv_entry[SOLD_DATE], DATE_FORMAT).date()
-    proceed = convert_currency(csv_entry[PROCEED].rstrip())
-    cost = convert_currency(csv_entry[COST].rstrip())
-    # short_term_gain_loss = convert_currency(csv_entry[SHORT_TERM_GAIN_LOSS])
-    # long_term_gain_loss = convert_currency(csv_entry[LONG_TERM_GAIN_LOSS])
-    quantity = Decimal(csv_entry[QUANTITY])
+                      csv_entry: list[str]) -> Transaction:
     return Transaction(
-        account_number, holding, cusip, csv_entry[DESCRIPTION],
-        quantity, acquired_date, sold_date, cost, proceed)
+        account_number, holding, cusip, *extract_csv_values(csv_entry))
         # short_term_gain_loss, long_term_gain_loss)
 
 
-def csv_entry_to_transaction(csv_entry, account_number: str):
+def csv_entry_to_transaction(
+    csv_entry: list[str],
+    account_number: str,
+    symbols: Container[str] | None = None
+) -> Transaction | None:
     symbol, cusip, expiration, option_type, strike = extract_symbol(
         csv_entry[SYMBOL])
-
+    if symbols is not None and symbol not in symbols:
+        return None
     if option_type is None:
         holding = Stock(symbol)
     elif option_type == 'p':
@@ -167,11 +276,14 @@ def csv_entry_to_transaction(csv_entry, account_number: str):
     return build_transaction(account_number, holding, cusip, csv_entry)
 
 
-def fixup_wash_sale(csv_entry, transaction: Transaction | None):
+def fixup_wash_sale(
+    csv_entry: list[str],
+    transaction: Transaction | None
+) -> None:
     try:
         assert transaction is not None
         assert csv_entry[WASH_SALE].lower() == 'wash sale'
-        wash_sale_amount = convert_currency(csv_entry[COST].rstrip())
+        wash_sale_amount = convert_currency(csv_entry[COST])
         assert \
             (transaction.proceed - transaction.cost) == wash_sale_amount
         transaction.wash_sale = True
@@ -179,24 +291,47 @@ def fixup_wash_sale(csv_entry, transaction: Transaction | None):
         logger.warn(f'Not Processed: {csv_entry}')
 
 
-def csv_to_transactions(
-    csv_file: str,
-    account_number: str = 'generic'
-) -> Iterable[Transaction]:
-    with Path(csv_file).expanduser().open('r') as text_stream:
+CSV_READ_BUFFER_SIZE = 1 << 20
+
+
+def csv_to_records(
+    csv_file: str | Path,
+    account_number: str,
+    entry_to_record: Callable[[list[str], str], Any]
+) -> Iterable:
+    # entry_to_record returns None for rows the caller is not interested in,
+    # the wash sale rows following such a row are skipped along with it
+    with Path(csv_file).expanduser().open(
+            'r', buffering=CSV_READ_BUFFER_SIZE, newline='') as text_stream:
         csv_reader = reader(text_stream)
         next(csv_reader)
-        current_transaction = None
-        fixup_transaction = None
+        current_record = None
+        fixup_record = None
+        skipping = False
         for entry in csv_reader:
             try:
-                current_transaction = csv_entry_to_transaction(
-                    entry, account_number)
-                if fixup_transaction is not None:
-                    yield fixup_transaction
-                fixup_transaction = current_transaction
+                current_record = entry_to_record(entry, account_number)
             except ValueError:
-                fixup_wash_sale(entry, fixup_transaction)
+                if not skipping:
+                    fixup_wash_sale(entry, fixup_record)
                 continue
-        if fixup_transaction is not None:
-            yield fixup_transaction
+            if fixup_record is not None:
+                yield fixup_record
+            fixup_record = current_record
+            skipping = current_record is None
+        if fixup_record is not None:
+            yield fixup_record
+
+
+def csv_to_transactions(
+    csv_file: str | Path,
+    account_number: str = 'generic',
+    symbols: Container[str] | None = None
+) -> Iterable[Transaction]:
+    # transaction ids are generated on first access and a repeated key gets
+    # the next sequence number, so read them in file order to get the same
+    # ids csv_to_trades stores in the database
+    entry_to_record = csv_entry_to_transaction
+    if symbols:
+        entry_to_record = partial(csv_entry_to_transaction, symbols=symbols)
+    return csv_to_records(csv_file, account_number, entry_to_record)
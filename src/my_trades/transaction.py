@@ -1,147 +1,203 @@
 #!/bin/env python
-from decimal import Decimal
-from collections import defaultdict
-from datetime import datetime, date
-from dateutil.relativedelta import relativedelta
-from itertools import chain
+from bisect import bisect_right
+from datetime import date, timedelta
+from functools import lru_cache
+from itertools import chain, groupby
+from operator import attrgetter, itemgetter
 from pathlib import Path
+import sys
 from typing import Iterable
-from .record import Option, Call, Put, Transaction, csv_to_transactions
+from .record import (
+    KIND_STOCK, Call, Put, Transaction, cents_to_decimal,
+    csv_to_transactions, parse_yymmdd)
 from .database import trade_row_to_transaction
 
 
-def in_date_range(
+def _merge_date_ranges(
+    date_ranges: Iterable[tuple[date | None, date | None]]
+) -> tuple[list[date], list[date]]:
+    starts = []
+    ends = []
+    for start_date, end_date in sorted(
+            (start_date or date.min, end_date or date.max)
+            for start_date, end_date in date_ranges
+            if start_date is not None or end_date is not None):
+        if ends and start_date <= ends[-1]:
+            if end_date > ends[-1]:
+                ends[-1] = end_date
+        else:
+            starts.append(start_date)
+            ends.append(end_date)
+    return starts, ends
+
+
+def in_ordinal_range(
     filtered_dates: Iterable[tuple[date | None, date | None] | date]
 ):
-    date_ranges = [date_data for date_data in filtered_dates
-                   if isinstance(date_data, tuple)]
-    dates = [date_data for date_data in filtered_dates
-             if not isinstance(date_data, tuple)]
-    def is_date_in_range(date_being_checked):
-        for start_date, end_date in date_ranges:
-            if start_date is None and end_date is None:
-                return False
-            if start_date and date_being_checked >= start_date \
-                    and not end_date:
-                return True
-            if end_date and date_being_checked <= end_date \
-                    and not start_date:
-                return True
-            if date_being_checked >= start_date \
-                    and date_being_checked <= end_date:
-                return True
-        for date_to_check in dates:
-            if date_being_checked == date_to_check:
-                return True
-        return False
-    return is_date_in_range
+    # the returned check takes date.toordinal() values, plain int
+    # comparisons are cheaper than comparing date objects
+    starts, ends = _merge_date_ranges(
+        date_data for date_data in filtered_dates
+        if isinstance(date_data, tuple))
+    starts = [start_date.toordinal() for start_date in starts]
+    ends = [end_date.toordinal() for end_date in ends]
+    ordinals = frozenset(date_data.toordinal() for date_data in filtered_dates
+                         if not isinstance(date_data, tuple))
+    def is_ordinal_in_range(ordinal_being_checked: int) -> bool:
+        position = bisect_right(starts, ordinal_being_checked) - 1
+        if position >= 0 and ordinal_being_checked <= ends[position]:
+            return True
+        return ordinal_being_checked in ordinals
+    return is_ordinal_in_range
 
 
 DEFAULT_DAY_RANGE = 30
-DAYS_BEFORE = relativedelta(days=-DEFAULT_DAY_RANGE)
-DAYS_AFTER = relativedelta(days=DEFAULT_DAY_RANGE)
+DAYS_BEFORE = timedelta(days=-DEFAULT_DAY_RANGE)
+DAYS_AFTER = timedelta(days=DEFAULT_DAY_RANGE)
+
+
+# returned by filter_transaction_by_dates when there is nothing to filter on
+_ALWAYS_TRUE = lambda _transaction: True
 
 
 def filter_transaction_by_dates(dates: str):
 
-    filtered_dates = set()
-    if dates:
-        filtered_dates = {
-            datetime.strptime(date_text.strip(), '%y%m%d').date() for date_text
-            in dates.split(',')
-        }
+    if not dates:
+        return _ALWAYS_TRUE
+    filtered_dates = {
+        parse_yymmdd(date_text.strip()) for date_text
+        in dates.split(',')
+    }
+
     transaction_period = {
         (date_entry + DAYS_BEFORE,
          date_entry + DAYS_AFTER) for date_entry in
         filtered_dates
     }
 
-    is_date_within_period = in_date_range(
+    is_ordinal_within_period = in_ordinal_range(
         transaction_period)
 
     def transaction_in_filtered_date(transaction):
-        if not filtered_dates:
-            return True
-        if isinstance(transaction.holding, Option):
+        if transaction.holding.kind != KIND_STOCK:
             if transaction.holding.expiration in filtered_dates:
                 return True
             return False
-        if is_date_within_period(transaction.acquired_date) \
-                or is_date_within_period(transaction.sold_date):
+        if is_ordinal_within_period(transaction.acquired_ord) \
+                or is_ordinal_within_period(transaction.sold_ord):
             return True
         return False
 
     return transaction_in_filtered_date
 
 
-def filter_transaction_by_symbols(symbols: str):
+def parse_symbols(symbols: str) -> frozenset[str]:
+    if not symbols:
+        return frozenset()
+    return frozenset(
+        sys.intern(symbol.strip().lower()) for symbol in symbols.split(','))
 
-    filtered_symbols = set()
 
-    if symbols:
-        filtered_symbols = {
-            symbol.strip().lower() for symbol in symbols.split(',')}
+REPORT_DATE_FORMAT = '%m-%d-%Y'
 
-    def transaction_in_filtered_symbols(transaction: Transaction):
-        if not filtered_symbols:
-            return True
-        if transaction.holding.symbol in filtered_symbols:
-            return True
-        return False
+# indexed by the wash sale flag
+_YES_NO = ('N', 'Y')
 
-    return transaction_in_filtered_symbols
 
+@lru_cache(maxsize=4096)
+def _format_date(value: date) -> str:
+    return value.strftime(REPORT_DATE_FORMAT)
 
-REPORT_DATE_FORMAT = '%m-%d-%Y'
-ZERO = Decimal(0)
 
-bool_to_yes_no = lambda v: "Y" if v else "N"
+def _report_dates_and_amounts(
+    transaction: Transaction, gain_loss: int
+) -> tuple:
+    return (
+        _format_date(transaction.acquired_date),
+        _format_date(transaction.sold_date),
+        transaction.cost_decimal,
+        transaction.proceed_decimal,
+        cents_to_decimal(gain_loss),
+        _YES_NO[transaction.wash_sale])
+
+
+def _call_report_component(
+    transaction: Transaction, gain_loss: int
+) -> tuple:
+    return (
+        transaction.quantity_decimal,
+        f'C: {transaction.holding.strike}',
+        _format_date(transaction.holding.expiration),
+        *_report_dates_and_amounts(transaction, gain_loss))
+
+
+def _put_report_component(
+    transaction: Transaction, gain_loss: int
+) -> tuple:
+    return (
+        transaction.quantity_decimal,
+        f'P: {transaction.holding.strike}',
+        _format_date(transaction.holding.expiration),
+        *_report_dates_and_amounts(transaction, gain_loss))
+
+
+def _stock_report_component(
+    transaction: Transaction, gain_loss: int
+) -> tuple:
+    return (
+        transaction.quantity_decimal, '', '',
+        *_report_dates_and_amounts(transaction, gain_loss))
+
+
+# anything that is not an option is reported like a stock
+_REPORT_COMPONENTS = {
+    Call: _call_report_component,
+    Put: _put_report_component,
+}
 
 
 def extract_report_component(
     transaction: Transaction
 ) -> tuple:
-    gain_loss = transaction.proceed - transaction.cost
-    if isinstance(transaction.holding, Call):
-        return (
-            transaction.quantity,
-            f'C: {transaction.holding.strike}',
-            transaction.holding.expiration.strftime(REPORT_DATE_FORMAT),
-            transaction.acquired_date.strftime(REPORT_DATE_FORMAT),
-            transaction.sold_date.strftime(REPORT_DATE_FORMAT),
-            transaction.cost,
-            transaction.proceed,
-            gain_loss,
-            bool_to_yes_no(transaction.wash_sale))
-    elif isinstance(transaction.holding, Put):
-        return (
-            transaction.quantity,
-            f'P: {transaction.holding.strike}',
-            transaction.holding.expiration.strftime(REPORT_DATE_FORMAT),
-            transaction.acquired_date.strftime(REPORT_DATE_FORMAT),
-            transaction.sold_date.strftime(REPORT_DATE_FORMAT),
-            transaction.cost,
-            transaction.proceed,
-            gain_loss,
-            bool_to_yes_no(transaction.wash_sale))
-    return (
-        transaction.quantity, '', '',
-        transaction.acquired_date.strftime(REPORT_DATE_FORMAT),
-        transaction.sold_date.strftime(REPORT_DATE_FORMAT),
-        transaction.cost,
-        transaction.proceed,
-        gain_loss,
-        bool_to_yes_no(transaction.wash_sale))
+    build_component = _REPORT_COMPONENTS.get(
+        type(transaction.holding), _stock_report_component)
+    return build_component(
+        transaction, transaction.proceed - transaction.cost)
 
 
 header_format = ('| {:10} | {:<10.2} | {:<10} | {:10} | '
                  '{:10} | {:10} | {:10} | {:10} | {:10} | {:9} |').format
-entry_format = ('| {:10} | {:<10.2f} | {:<10} | {:10} | {:10} '
-                '| {:10} | {:10} | {:10} | {:10} | {:9} |').format
-header_break = '+' + '='* 128 + '+'
+
+
+def entry_format(symbol, quantity, strike, expiration, acquired, sold, cost,
+                 proceed, gain_loss, wash_sale) -> str:
+    # the row template is compiled once as an f-string instead of being
+    # parsed by str.format on every row
+    return (f'| {symbol:10} | {quantity:<10.2f} | {strike:<10} | '
+            f'{expiration:10} | {acquired:10} | {sold:10} | {cost:10} | '
+            f'{proceed:10} | {gain_loss:10} | {wash_sale:9} |')
+
+
+header_break = sys.intern('+' + '=' * 128 + '+')
 # entry_break = '+' + '-' * 103 + '+'
-entry_break = ('+' + ('-' * 12 + '+') + ('-' * 12 + '+') * 7
-               + '-' * 12 + '+' + '-' * 11 + '+')
+entry_break = sys.intern('+' + '+'.join(['-' * 12] * 9 + ['-' * 11]) + '+')
+symbol_total_format = ('|' + ' ' * 90 + '| {:10} | {:10} | {:9} |').format
+summary_total_format = ('|' + ' ' * 77 + '| {:>23} | {:10} | {:9} |').format
+
+
+def _build_rows(
+    transactions: Iterable[Transaction]
+) -> tuple[list[tuple], int]:
+    # one pass over the transactions for both the row components and the
+    # gain/loss total, formatting then only works on the tuples
+    report_component = extract_report_component
+    rows = []
+    total = 0
+    for transaction in transactions:
+        rows.append(report_component(transaction))
+        if not transaction.wash_sale:
+            total += transaction.proceed - transaction.cost
+    return rows, total
 
 
 def report_in_text(result: dict):
@@ -150,140 +206,182 @@ def report_in_text(result: dict):
         'Symbol', 'quantity', 'Strike', 'Expiration', 'Acquired', 'Sold',
         'Cost', 'Proceed', 'Gain/Loss', 'Wash Sale')
     yield header_break
-    total_summary = Decimal(0)
+    # looked up once, called for every row
+    format_entry = entry_format
+    total_summary = 0
     for symbol, transactions in result.items():
-        do_symbol_output = True
-        total = Decimal(0)
-        for transaction in transactions:
-            if do_symbol_output:
-                do_symbol_output = False
-                yield entry_format(
-                    symbol, *extract_report_component(transaction))
-            else:
-                yield entry_format('', *extract_report_component(transaction))
-            if not transaction.wash_sale:
-                total += transaction.proceed - transaction.cost
+        rows, total = _build_rows(transactions)
+        # only the first row of a symbol shows the symbol
+        if rows:
+            yield format_entry(symbol, *rows[0])
+            for row in rows[1:]:
+                yield format_entry('', *row)
         total_summary += total
         yield entry_break
-        yield '|' + ' ' * 90 + '| {:10} | {:10} | {:9} |'.format('gain/loss', total, '')
+        yield symbol_total_format('gain/loss', cents_to_decimal(total), '')
         yield entry_break
-    yield '|' + ' ' * 77 + '| {:>23} | {:10} | {:9} |'.format(
-        'total gain/loss', total_summary, '')
+    yield summary_total_format(
+        'total gain/loss', cents_to_decimal(total_summary), '')
     yield entry_break
 
 
+summary_header_format = '| {:10} | {:>10} |'.format
+summary_entry_format = '| {:10} | {:10} |'.format
+summary_header_break = '+' + '=' * 25 + '+'
+summary_entry_break = '+' + '-' * 12 + '+' + '-' * 12 + '+'
+
+
+def summary_in_text(result: Iterable[tuple[str, int]]):
+    yield summary_header_break
+    yield summary_header_format('Symbol', 'Gain/Loss')
+    yield summary_header_break
+    total_summary = 0
+    for symbol, gain_loss in result:
+        total_summary += gain_loss
+        yield summary_entry_format(symbol, cents_to_decimal(gain_loss))
+    yield summary_entry_break
+    yield summary_entry_format('total', cents_to_decimal(total_summary))
+    yield summary_entry_break
+
+
+def write_report(lines: Iterable[str]):
+    write = sys.stdout.write
+    for line in lines:
+        write(line)
+        write('\n')
+
+
+holding_symbol = attrgetter('holding.symbol')
+
+
 def _handle_csv(cli_args):
     in_filtered_dates = filter_transaction_by_dates(cli_args.dates)
-    in_filtered_symbols = filter_transaction_by_symbols(cli_args.symbols)
-    final_result = defaultdict(list)
-    for transaction in csv_to_transactions(cli_args.file, cli_args.account):
-        if in_filtered_symbols(transaction) \
-                and in_filtered_dates(transaction):
-            final_result[transaction.holding.symbol].append(transaction)
+    # the symbol filter is applied while reading, rows for other symbols
+    # are never turned into transactions
+    transactions = csv_to_transactions(
+        cli_args.file, cli_args.account, parse_symbols(cli_args.symbols))
+    if in_filtered_dates is _ALWAYS_TRUE:
+        survivors = list(transactions)
+    else:
+        survivors = list(filter(in_filtered_dates, transactions))
+    # stable sort, rows keep their file order within a symbol
+    survivors.sort(key=holding_symbol)
+    final_result = {
+        symbol: list(group)
+        for symbol, group in groupby(survivors, key=holding_symbol)}
 
-    print("\n".join(report_in_text(final_result)))
+    write_report(report_in_text(final_result))
 
 
-def new_account_filter_sql(account_type: str):
+def new_account_filter_sql(account_type: str) -> tuple[str, list]:
     if account_type == 'both':
         query_both_account = \
 """
 SELECT account_number FROM account
 """
-        return query_both_account.strip()
+        return query_both_account.strip(), []
 
     query_with_filter = \
 """
 SELECT account_number FROM account
-WHERE account_type = '{}'
+WHERE account_type = ?
 """
-    return query_with_filter.format(account_type).strip()
-
-
-SQL_DATE = "date('{}')".format
+    return query_with_filter.strip(), [account_type]
 
 
 def parse_date(date_range: str):
     if '-' in date_range:
         start_date, end_date = date_range.split('-')
-        start_date = datetime.strptime(start_date.strip(), '%y%m%d').date() \
-            if start_date else None
-        end_date = datetime.strptime(end_date.strip(), '%y%m%d').date() \
-            if end_date else None
+        start_date = parse_yymmdd(start_date.strip()) if start_date else None
+        end_date = parse_yymmdd(end_date.strip()) if end_date else None
         return (start_date, end_date)
-    return datetime.strptime(date_range.strip(), '%y%m%d').date()
+    return parse_yymmdd(date_range.strip())
 
 
-def date_range_filter_sql(date_range: tuple[date | None, date | None]) -> str:
+def date_range_filter_sql(
+    date_range: tuple[date | None, date | None]
+) -> tuple[str, list[date]]:
     start_date, end_date = date_range
     if start_date and end_date:
-        return f'BETWEEN {SQL_DATE(start_date)} and {SQL_DATE(end_date)}'
+        return 'BETWEEN ? and ?', [start_date, end_date]
     if start_date:
-        return f'>= {SQL_DATE(start_date)}'
-    return f'<= {SQL_DATE(end_date)}'
+        return '>= ?', [start_date]
+    return '<= ?', [end_date]
 
 
 def _dates_filter_sql(
     field_name: str,
     dates: tuple[list[tuple[date | None, date | None]], list[date]]
-) -> str:
-    date_range_filter = (
-        '({} {})'.format(field_name, date_range_filter_sql(date_range))
-        for date_range in dates[0])
-    date_filter = ('({} IN ({}))'.format(field_name,
-        ", ".join(map(lambda x: SQL_DATE(x), dates[1]))),) if dates[1] \
-        else tuple()
-    return " OR ".join(chain(date_range_filter, date_filter))
-
-
-def group_dates(
-    dates: Iterable[tuple[date | None, date | None] | date]
-) -> tuple[list[tuple[date | None, date | None]], list[date]]:
+) -> tuple[str, list[date]]:
+    range_filters = [
+        date_range_filter_sql(date_range) for date_range in dates[0]]
+    prefix = f'({field_name} '
+    date_filters = [f'{prefix}{range_sql})' for range_sql, _ in range_filters]
+    params = [param for _, range_params in range_filters
+              for param in range_params]
+    if dates[1]:
+        date_filters.append('({} IN ({}))'.format(
+            field_name, ", ".join('?' * len(dates[1]))))
+        params.extend(dates[1])
+    return " OR ".join(date_filters), params
+
+
+def dates_filter_sql(field_name: str, dates: str) -> tuple[str, list[date]]:
+    if not dates:
+        return "", []
     date_ranges = []
     single_dates = []
-    for date in dates:
-        if isinstance(date, tuple):
-            date_ranges.append(date)
+    for date_text in dates.split(','):
+        parsed = parse_date(date_text.strip())
+        # parse_date returns a tuple only for ranges, never a subclass
+        if parsed.__class__ is tuple:
+            date_ranges.append(parsed)
         else:
-            single_dates.append(date)
-    return date_ranges, single_dates
+            single_dates.append(parsed)
+    return _dates_filter_sql(field_name, (date_ranges, single_dates))
 
 
-def dates_filter_sql(field_name: str, dates: str) -> str:
-    if not dates:
-        return ""
-    dates_group = group_dates(
-        parse_date(date.strip()) for date in dates.split(','))
-    return _dates_filter_sql(field_name, dates_group)
+def new_symbols_filter_sql(symbols) -> tuple[str, list[str]]:
+    if not symbols:
+        return "", []
+    symbols = [symbol.strip() for symbol in symbols.split(",")]
+    symbol_filter_sql = "symbol IN ({})".format(", ".join('?' * len(symbols)))
+    return symbol_filter_sql, symbols
 
 
-def new_symbols_filter_sql(symbols):
-    if not symbols:
-        return ""
-    symbol_filter_sql = "symbol IN ({})".format(
-        ", ".join(map(lambda x: f"'{x.strip()}'", symbols.split(","))))
-    return symbol_filter_sql
+_ACCOUNT_CLAUSE = '(account_number IN ({}))'.format
+_FILTER_CLAUSE = '({})'.format
+_WHERE_CLAUSES = (
+    _ACCOUNT_CLAUSE, _FILTER_CLAUSE, _FILTER_CLAUSE, _FILTER_CLAUSE)
 
 
 def new_where_sql(
     account_filter, symbol_filter, expiration_filter,
-    date_range_filter) -> str:
-    where_clause = []
-    if account_filter:
-        where_clause.append(f'(account_number IN ({account_filter}))')
-    if symbol_filter:
-        where_clause.append(f'({symbol_filter})')
-    if expiration_filter:
-        where_clause.append(f'({expiration_filter})')
-    if date_range_filter:
-        where_clause.append(f'({date_range_filter})')
+    date_range_filter) -> tuple[str, list]:
+    # each filter is a (sql, params) pair, params are bound in the same
+    # order the fragments appear in the where clause
+    filters = (
+        account_filter, symbol_filter, expiration_filter, date_range_filter)
+    where_clause = [
+        clause(filter_sql)
+        for clause, (filter_sql, _) in zip(_WHERE_CLAUSES, filters)
+        if filter_sql]
+    params = [param for filter_sql, filter_params in filters if filter_sql
+              for param in filter_params]
     if where_clause:
-        return f" WHERE {' AND '.join(where_clause)}"
-    return ""
+        return f" WHERE {' AND '.join(where_clause)}", params
+    return "", params
 
 
 SELECT_TRADE_SQL = 'SELECT * FROM trade'
 TRADE_ORDER_SQL = ' ORDER BY symbol, equity_class, sold_date'
+TRADE_FETCH_SIZE = 10000
+# wash sale losses are disallowed, same as the totals in report_in_text
+SELECT_SUMMARY_SQL = (
+    'SELECT symbol, '
+    'SUM(CASE WHEN wash_sale THEN 0 ELSE proceed - cost END) FROM trade')
+SUMMARY_GROUP_SQL = ' GROUP BY symbol ORDER BY symbol'
+
 
 def _handle_db(cli_args):
     from .database import init_connection
@@ -293,17 +391,29 @@ def _handle_db(cli_args):
     sold_date_sql = dates_filter_sql('sold_date', cli_args.dates)
     symbol_filter_sql = new_symbols_filter_sql(cli_args.symbols)
     #conn = init_connection(f'{cli_args.db_file}')
-    where_sql = new_where_sql(
+    where_sql, params = new_where_sql(
         account_filter_sql, symbol_filter_sql, expiration_filter_sql,
         sold_date_sql)
-    query_sql = SELECT_TRADE_SQL + where_sql + TRADE_ORDER_SQL + ';'
     conn = init_connection(f'{cli_args.db_file}')
-    transactions = defaultdict(list)
+    if cli_args.summary:
+        # only the per symbol sums are needed, sqlite computes them
+        query_sql = SELECT_SUMMARY_SQL + where_sql + SUMMARY_GROUP_SQL + ';'
+        print(query_sql)
+        write_report(summary_in_text(conn.execute(query_sql, params)))
+        return
+    query_sql = SELECT_TRADE_SQL + where_sql + TRADE_ORDER_SQL + ';'
     print(query_sql)
-    for row in conn.execute(query_sql):
-        transaction = trade_row_to_transaction(row)
-        transactions[transaction.holding.symbol].append(transaction)
-    print("\n".join(report_in_text(transactions)))
+    cursor = conn.execute(query_sql, params)
+    cursor.arraysize = TRADE_FETCH_SIZE
+    symbol_column = [
+        column[0] for column in cursor.description].index('symbol')
+    rows = chain.from_iterable(iter(cursor.fetchmany, []))
+    convert = trade_row_to_transaction
+    # TRADE_ORDER_SQL sorts by symbol, so each symbol's rows are contiguous
+    transactions = {
+        symbol: list(map(convert, group))
+        for symbol, group in groupby(rows, key=itemgetter(symbol_column))}
+    write_report(report_in_text(transactions))
 
 
 def _main_entrypoint(cli_args):
@@ -314,8 +424,6 @@ def _main_entrypoint(cli_args):
 
 if __name__ == '__main__':
 
-    import sys
-
     def build_csv_sub_command_parser(sub_parser):
         sub_parser.add_argument(
             '-file', action='store', type=Path,
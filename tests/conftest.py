@@ -0,0 +1,20 @@
+import pytest
+
+
+# account numbers are part of the transaction id key and the id sequence is
+# kept for the whole process, so each test reads it with its own account
+SAMPLE_CSV = """\
+Symbol(CUSIP),Security Description,Quantity,Date Acquired,Date Sold,Proceeds,Cost,Short Term Gain/Loss,Long Term Gain/Loss
+AAPL(037833100),APPLE INC COM,10,01/04/2021,06/01/2022,$1500.00,$1234.56,,
+AAPL(037833100),APPLE INC COM,10,01/04/2021,06/01/2022,$1500.00,$1234.56,,
+TSLA220121C1000(88160R101),CALL (TSLA) OPTION,1,11/01/2021,01/10/2022,$250.00,$400.00,,
+,,,,Wash Sale,,($150.00),,
+MSFT(594918104),MICROSOFT CORP COM,2.5,03/15/2022,07/01/2022,$600.00,$700.00,,
+"""
+
+
+@pytest.fixture
+def sample_csv(tmp_path):
+    csv_file = tmp_path / 'sample.csv'
+    csv_file.write_text(SAMPLE_CSV)
+    return csv_file
@@ -0,0 +1,84 @@
+from my_trades import database, record
+from my_trades.database import csv_to_trades
+from my_trades.record import convert_currency, csv_to_transactions
+
+
+# the loss on the msft row and the one on the aapl row above it are the
+# same, so a wash sale row applied to the wrong record would still match
+FILTERED_WASH_SALE_CSV = """\
+Symbol(CUSIP),Security Description,Quantity,Date Acquired,Date Sold,Proceeds,Cost,Short Term Gain/Loss,Long Term Gain/Loss
+AAPL(037833100),APPLE INC COM,10,01/04/2022,02/01/2022,$500.00,$600.00,,
+MSFT(594918104),MICROSOFT CORP COM,5,01/05/2022,02/02/2022,$500.00,$600.00,,
+,,,,Wash Sale,,($100.00),,
+"""
+
+
+def test_convert_currency():
+    assert convert_currency('$1,234.56') == 123456
+    assert convert_currency('($5.00)') == -500
+    assert convert_currency('') == 0
+    assert convert_currency('-') == 0
+
+
+def test_transaction_ids_are_stable(sample_csv):
+    # ids are stored as the trade primary key, these are the values the
+    # original Decimal based code produced for the same statement
+    transactions = list(csv_to_transactions(sample_csv, 'X12345678'))
+    assert [t.transaction_id for t in transactions] == [
+        '47567dcc-ad77-3620-b3bd-fe933248324f',
+        # same key as the row above, sequence -02
+        '10edeff2-05ea-3f3b-8265-289c6c10fef4',
+        'e699f85b-63ce-378e-b183-249bfa131859',
+        '5b4c3c46-26da-35ec-a084-dac0aff1b1ff',
+    ]
+    assert [(t.holding.symbol, t.cost, t.proceed, t.wash_sale)
+            for t in transactions] == [
+        ('aapl', 123456, 150000, False),
+        ('aapl', 123456, 150000, False),
+        ('tsla', 40000, 25000, True),
+        ('msft', 70000, 60000, False),
+    ]
+
+
+def test_lazy_ids_follow_file_order(sample_csv, monkeypatch):
+    def fresh_ids():
+        # both readers share the sequence, give each read a new one
+        generate_id = record._new_transaction_id()
+        monkeypatch.setattr(record, 'new_transaction_id', generate_id)
+        monkeypatch.setattr(database, 'new_transaction_id', generate_id)
+
+    fresh_ids()
+    trade_ids = [t.transaction_id
+                 for t in csv_to_trades(sample_csv, 'X87654321')]
+    assert trade_ids == [
+        'f8649115-b336-307a-a0c2-1d7a2ddb860c',
+        'e5d7c985-3e2a-3b03-921a-7f8dabfb94d3',
+        '7e443363-8ff0-3c1a-b1ad-0e8a46b6da94',
+        '71decfe8-a695-373d-8215-4031060bf260',
+    ]
+
+    fresh_ids()
+    transactions = list(csv_to_transactions(sample_csv, 'X87654321'))
+    assert [t.transaction_id for t in transactions] == trade_ids
+
+    fresh_ids()
+    transactions = list(csv_to_transactions(sample_csv, 'X87654321'))
+    reversed_ids = [t.transaction_id for t in reversed(transactions)]
+    # the duplicate aapl rows swap their sequence numbers
+    assert reversed_ids[::-1] == [
+        trade_ids[1], trade_ids[0], trade_ids[2], trade_ids[3]]
+
+
+def test_wash_sale_of_filtered_row_is_skipped(tmp_path, caplog):
+    csv_file = tmp_path / 'statement.csv'
+    csv_file.write_text(FILTERED_WASH_SALE_CSV)
+    transactions = list(csv_to_transactions(csv_file, 'X20000001'))
+    assert [(t.holding.symbol, t.wash_sale) for t in transactions] == [
+        ('aapl', False), ('msft', True)]
+
+    transactions = list(csv_to_transactions(
+        csv_file, 'X20000002', frozenset({'aapl'})))
+    assert [(t.holding.symbol, t.wash_sale) for t in transactions] == [
+        ('aapl', False)]
+    # skipped along with its row, not reported as unprocessed
+    assert 'Not Processed' not in caplog.text
@@ -0,0 +1,26 @@
+from argparse import Namespace
+from my_trades.database import csv_to_trades, init_connection, insert_trades
+from my_trades.transaction import _handle_db
+
+
+def test_db_summary_totals(tmp_path, sample_csv, capsys):
+    db_file = tmp_path / 'trades.db'
+    connection = init_connection(db_file, for_read=False)
+    insert_trades(
+        csv_to_trades(sample_csv, 'X30000001'),
+        'single')(connection)
+    connection.close()
+
+    _handle_db(Namespace(
+        db_file=db_file, account='both', symbols=None, expiration=None,
+        dates='', summary=True))
+    lines = capsys.readouterr().out.splitlines()
+    # wash sale losses are left out of the totals
+    assert lines[-6:] == [
+        '| aapl       |     530.88 |',
+        '| msft       |    -100.00 |',
+        '| tsla       |       0.00 |',
+        '+------------+------------+',
+        '| total      |     430.88 |',
+        '+------------+------------+',
+    ]